@@ -0,0 +1,28 @@
+"""Remote host agent, lets the bot on another machine run servers on this one.
+
+Usage: PICONTROLLER_AGENT_TOKEN=secret python agent.py --port 8765 --root /path/to/root
+Then add the host to the bot's data.json settings:
+    "hosts": {"name": {"address": "...", "port": 8765, "token": "secret"}}"""
+from core.agent import Agent
+import argparse
+import asyncio
+import os
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Pi-Controller remote host agent.")
+    parser.add_argument("--address", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--root", default=os.path.dirname(os.path.realpath(__file__)),
+                        help="directory servers are stored under, mirrors the bot directory.")
+    parser.add_argument("--reserved-cores", type=int, nargs="*", default=None,
+                        help="cores kept free of servers, defaults to core 0 on multi-core hosts.")
+    parser.add_argument("--cgroup", default=None, help="delegated cgroup v2 directory for server cgroups.")
+    parser.add_argument("--cache-mb", type=int, default=2048, help="size limit of the download cache.")
+    args = parser.parse_args()
+    config = {"cgroup": args.cgroup}
+    if args.reserved_cores is not None:
+        config['reserved_cores'] = args.reserved_cores
+    os.makedirs(os.path.join(args.root, "data", "servers"), exist_ok=True)
+    agent = Agent(args.root, os.environ['PICONTROLLER_AGENT_TOKEN'], config, args.cache_mb * 1024 * 1024)
+    asyncio.run(agent.serve(args.address, args.port))
@@ -1,6 +1,8 @@
 from discord.ext import commands, tasks
 import core.common as common
 import core.embed as ebed
+import core.thermal as thermal
+import core.perf as perf
 import asyncio
 import datetime
 import pytz
@@ -32,7 +34,7 @@ class Core(commands.Cog):
     async def admins(self, ctx):
         """Manage bot admins."""
         if ctx.invoked_subcommand is None:
-            await ctx.send("Invalid command.")
+            await self.bot.outbound.send(ctx, "Invalid command.")
 
     @admins.command()
     async def list(self, ctx):
@@ -56,7 +58,7 @@ class Core(commands.Cog):
                               color=color)
         embed.add_field(name=admin_count, value=msg)
         embed.set_footer(text=ebed.rgb_to_hex(color.to_rgb()))
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @admins.command(pass_context=True)
     @commands.check(is_admin)
@@ -66,9 +68,9 @@ class Core(commands.Cog):
         if user.id not in data['admins']:
             data['admins'].append(user.id)
             await common.dumpjson(data, os.path.join(common.getbotdir(), "data/data.json"))
-            await ctx.send("{} is now a bot admin.".format(user.mention))
+            await self.bot.outbound.send(ctx, "{} is now a bot admin.".format(user.mention))
         else:
-            await ctx.send("{} is already a bot admin.".format(user.mention))
+            await self.bot.outbound.send(ctx, "{} is already a bot admin.".format(user.mention))
 
     @admins.command(pass_context=True)
     @commands.is_owner()
@@ -82,7 +84,7 @@ class Core(commands.Cog):
             embed.description = "{} is no longer a bot admin.".format(user.mention)
         else:
             embed.description = "{} is not a bot admin.".format(user.mention)
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @commands.command(pass_context=True)
     @commands.check(is_admin)
@@ -91,7 +93,7 @@ class Core(commands.Cog):
         print("Running restart")
         embed = discord.Embed(color=ebed.randomrgb())
         embed.description = "Be right back!"
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
         os.execl(sys.executable, sys.executable, *sys.argv)
 
     @commands.command(pass_context=True)
@@ -100,7 +102,7 @@ class Core(commands.Cog):
         """Shut down the bot."""
         embed = discord.Embed(color=ebed.randomrgb())
         embed.description = "Goodbye!"
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
         sys.exit()
 
     @commands.command(pass_context=True)
@@ -112,7 +114,7 @@ class Core(commands.Cog):
         embed.add_field(name="Arg 0", value="name: {}".format(str(sys.argv[0])))
         embed.add_field(name="Folder", value="name: {}".format(str(os.path.dirname(sys.argv[0]))))
         embed.add_field(name="Full Path", value=os.path.realpath(os.path.dirname(sys.argv[0])))
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @commands.command()
     @commands.is_owner()
@@ -128,11 +130,11 @@ class Core(commands.Cog):
         common.remfile("icon")
         embed.set_image(url=url)
         embed.description = "Set the bot's avatar."
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @seticon.error
     async def seticonerror(self, ctx, error):
-        await ctx.send(error.args[0])
+        await self.bot.outbound.send(ctx, error.args[0])
 
     @commands.command()
     async def status(self, ctx):
@@ -149,20 +151,70 @@ class Core(commands.Cog):
         if self.platform == 'linux':  # platform specific feature
             embed.add_field(name="Temperature",
                             value="{}°C/{}°F".format(self.sys_status["TEMPC"], self.sys_status["TEMPF"]))
+        servers = self.bot.get_cog("Servers")
+        if servers is not None:
+            for host_name, governor in servers.governors.items():
+                value = "Throttling" if governor.throttled else "Normal"
+                for time, decision in governor.decisions:
+                    value += "\n`{}` {}".format(time, decision)
+                embed.add_field(name="Thermal Governor ({})".format(host_name), value=value, inline=False)
         embed.add_field(name="Boot Time", value=self.sys_status["BOOT"], inline=False)
         embed.add_field(name="IP Address", value=self.sys_status["IP"], inline=False)
         embed.set_footer(text=ebed.rgb_to_hex(color.to_rgb()))
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
+
+    @commands.group()
+    @commands.check(is_admin)
+    async def debug(self, ctx):
+        """Debugging tools."""
+        if ctx.invoked_subcommand is None:
+            await self.bot.outbound.send(ctx, "Invalid command.")
+
+    @debug.command(name="perf")
+    async def perf_stats(self, ctx, option: str = None):
+        """Show p50/p95/p99 timings per step type and the slowest recent traces. Use 'reset' to clear."""
+        color = ebed.randomrgb()
+        embed = discord.Embed(title="Performance", color=color)
+        if option == "reset":
+            perf.store.clear()
+            embed.description = "Cleared all timing data."
+            await self.bot.outbound.send(ctx, embed=embed)
+            return
+        stats = [(name, perf.store.percentiles(name)) for name in list(perf.store.samples)]
+        stats = [item for item in stats if item[1]['count'] > 0]
+        stats.sort(key=lambda item: item[1]['p95'], reverse=True)
+        if len(stats) == 0:
+            embed.description = "No timing data recorded yet."
+        for name, result in stats[:20]:  # embeds are limited to 25 fields.
+            embed.add_field(name="{} ({})".format(name, result['count']),
+                            value="{:.1f} / {:.1f} / {:.1f} ms".format(result['p50'] * 1000,
+                                                                       result['p95'] * 1000,
+                                                                       result['p99'] * 1000))
+        msg = ""
+        for trace in perf.store.slowest(5):
+            steps = sorted(trace.children, key=lambda child: child.duration, reverse=True)[:3]
+            msg += "\n**{}** {} - {:.1f}ms ({})".format(trace.name, trace.detail or "", trace.duration * 1000,
+                                                       ", ".join("{} {:.1f}ms".format(step.name, step.duration * 1000)
+                                                                 for step in steps))
+        if len(msg) > 0:
+            embed.add_field(name="Slowest Traces", value=msg[:1024], inline=False)
+        depth = self.bot.outbound.depth()
+        if len(depth) > 0:
+            embed.add_field(name="Outbound Queues",
+                            value="\n".join("<#{}>: {}".format(key, count) for key, count in depth.items())[:1024],
+                            inline=False)
+        embed.set_footer(text="p50 / p95 / p99 - {}".format(ebed.rgb_to_hex(color.to_rgb())))
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @add.error
     async def add_error(self, ctx, error):
         if isinstance(error, commands.BadArgument):
-            await ctx.send(error.args[0])
+            await self.bot.outbound.send(ctx, error.args[0])
 
     @commands.command()
     async def invite(self, ctx):
         """Get a bot invite."""
-        await ctx.send("https://discord.com/api/oauth2/authorize?client_id=714607226756661258&permissions=116800&scope=bot")
+        await self.bot.outbound.send(ctx, "https://discord.com/api/oauth2/authorize?client_id=714607226756661258&permissions=116800&scope=bot")
 
     @tasks.loop(minutes=1)
     async def sys_monitor(self):
@@ -173,8 +225,9 @@ class Core(commands.Cog):
         self.sys_status["RAM"] = round(psutil.virtual_memory().percent)
         self.sys_status["DISK"] = round(psutil.disk_usage("/").percent)
         if self.platform == 'linux':  # platform specific feature
-            self.sys_status["TEMPF"] = psutil.sensors_temperatures()
-            self.sys_status["TEMPC"] = psutil.sensors_temperatures()
+            temp = thermal.read_soc_temp()
+            self.sys_status["TEMPC"] = round(temp, 1) if temp is not None else "?"
+            self.sys_status["TEMPF"] = round(thermal.c_to_f(temp), 1) if temp is not None else "?"
         self.sys_status["BOOT"] = tz.localize(datetime.datetime.fromtimestamp(psutil.boot_time())).strftime("%Y-%m-%d%t%H:%M:%S %Z")
         self.sys_status["IP"] = requests.get("https://api.ipify.org?format=json").json()['ip']
         self.sys_status["LATENCY"] = self.bot.latency
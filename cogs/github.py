@@ -27,7 +27,7 @@ class Github(commands.Cog):
     async def github(self, ctx):
         embed = discord.Embed(color=ebed.randomrgb())
         embed.description = "[Bot Github Link!](https://github.com/InValidFire/Pi-Controller)"
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @commands.group(aliases=['contributor'])
     async def contributors(self, ctx):
@@ -42,7 +42,7 @@ class Github(commands.Cog):
                     break
                 embed.add_field(name="{}'s latest contribution".format(contributor.login),
                                 value="[{sha}]({url})".format(sha=latest_commit.sha, url=latest_commit.html_url))
-            await ctx.send(embed=embed)
+            await self.bot.outbound.send(ctx, embed=embed)
 
     @contributors.command(pass_context=True)
     @commands.is_owner()
@@ -54,7 +54,7 @@ class Github(commands.Cog):
         await common.dumpjson(data, os.path.join(common.getbotdir(), "data", "data.json"))
         embed = discord.Embed(color=ebed.randomrgb())
         embed.description = "{} has been linked to the Github Profile '{}'".format(user.mention, github_profile)
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @contributors.command()
     async def user(self, ctx, github_profile):
@@ -76,7 +76,7 @@ class Github(commands.Cog):
                 embed.title = "Last {} commits for user: {}".format(i + 1, github_profile)
                 if i == 9:
                     break
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @user.error
     async def user_error(self, ctx, error):
@@ -85,7 +85,7 @@ class Github(commands.Cog):
             embed.description = "That user is not a contributor."
         if isinstance(error, github.UnknownObjectException):
             embed.description = "The Github user could not be found."
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
 
 
 def setup(bot):
@@ -1,8 +1,17 @@
 from discord.ext import commands, tasks
 from cogs.core import is_admin
 import core.common as common
+import core.errors as errors
 import core.embed as ebed
+import core.outbound as outbound
+import core.thermal as thermal
+import core.hosts as hosts
+import core.perf as perf
+import core.disk as disk
+import psutil
 import shlex
+import time
+import re
 import discord
 import asyncio
 import os
@@ -43,15 +52,6 @@ async def load_file_args(data: dict) -> dict:
     return data
 
 
-async def asyncio_subprocess(program):
-    """Runs a async compatible subprocess, returning the created process."""
-    process = await asyncio.create_subprocess_exec(*program,
-                                                   stdout=asyncio.subprocess.PIPE,
-                                                   stdin=asyncio.subprocess.PIPE,
-                                                   stderr=asyncio.subprocess.PIPE)
-    return process
-
-
 async def load_embed(meta: dict) -> discord.Embed:
     """Common embed builder used to create embeds used with server messages."""
     if "embed_color" in meta:  # load color
@@ -77,17 +77,44 @@ def getserverjson(server: str):
     return path
 
 
+def step_type(step: dict) -> str:
+    """Get the name of the step type used for tracing."""
+    for key in ['file', 'presence', 'shell', 'channel', 'console', 'command', 'directory', 'process']:
+        if key in step:
+            return key
+    return "unknown"
+
+
+def getserverroot():
+    """Get the directory holding every server directory."""
+    return os.path.join(common.getbotdir(), "data", "servers")
+
+
 class Servers(commands.Cog):
     """Cog focused for controlling 3rd-Party Servers through JSON data."""
     def __init__(self, bot):
         self.bot = bot
         self.server_data = None
+        self.server_name = None
         self.current_console = None
         self.current_process = None
         self.current_dir = None
+        self.host = None  # host the running server lives on.
+        self.hosts = None
+        self.governors = {}  # thermal.Governor per host name, hosts heat up independently.
+        self.throttle_state = None  # how the running server was throttled, to undo it.
+        self.last_activity = None
+        self.players = 0
+        self.stop_reason = None
+        self.sleeping = {}  # idle servers waiting for a connection to wake them, by name.
         self.main_dir = os.getcwd()
+        self.disk = disk.DiskAccountant(getserverroot)
+        self.disk.start()
         self.server_cleanup.start()
+        self.thermal_governor.start()
+        self.idle_monitor.start()
 
+    @perf.timed("servers.getserverdir")
     async def getserverdir(self, server_name: str = None, dirname: str = None):
         """Get the directory path of the given name."""
         if dirname is None:
@@ -104,41 +131,319 @@ class Servers(commands.Cog):
         else:
             return os.path.join(common.getbotdir(), "data", "servers", main_dir, request)
 
+    async def gethosts(self) -> dict:
+        """Get every host servers can run on, loaded from the bot settings on first use."""
+        if self.hosts is None:
+            data = await common.loadjson("data/data.json")
+            self.hosts = hosts.load(data['settings'])
+        return self.hosts
+
+    def getgovernor(self, host_name: str) -> thermal.Governor:
+        if host_name not in self.governors:
+            self.governors[host_name] = thermal.Governor()
+        return self.governors[host_name]
+
+    async def gethost(self, server_name: str, meta: dict):
+        """Get the host the given server is assigned to.
+
+        Servers without a 'host' in their meta are placed on the least loaded host,
+        which is then saved to their JSON file."""
+        host_list = await self.gethosts()
+        if 'host' not in meta:
+            if os.path.exists(await self.getserverdir(server_name=server_name)):
+                name = "local"  # already installed here before hosts existed.
+            else:
+                host = await hosts.least_loaded(host_list)
+                if host is None:
+                    raise errors.AgentError("No host is reachable to place '{}' on.".format(server_name))
+                name = host.name
+            data = await common.loadjson(getserverjson(server_name))
+            data['meta']['host'] = name
+            await common.dumpjson(data, getserverjson(server_name))
+            meta['host'] = name
+            print("Placed server '{}' on host '{}'".format(server_name, name))
+        if meta['host'] not in host_list:
+            raise errors.AgentError("Host '{}' is not configured.".format(meta['host']))
+        return host_list[meta['host']]
+
+    async def disk_policy(self):
+        """Get the minimum free bytes and the policy ('warn' or 'refuse') from the bot settings."""
+        data = await common.loadjson("data/data.json")
+        settings = data['settings'].get('disk', {})
+        return settings.get('min_free_mb', 1024) * 1024 * 1024, settings.get('policy', 'warn')
+
+    async def check_disk(self):
+        """Check free space against the disk policy. Returns a warning message, or None if there is room.
+
+        Raises DiskSpaceError when the policy is set to refuse."""
+        min_free, policy = await self.disk_policy()
+        await self.host.makedirs(getserverroot())
+        free = await self.host.free_space(getserverroot())
+        if free >= min_free:
+            return None
+        msg = "Low disk space on '{}': {} free, {} required to stay free.".format(
+            self.host.name, disk.format_size(free), disk.format_size(min_free))
+        if policy == 'refuse':
+            raise errors.DiskSpaceError(msg)
+        return msg
+
     async def download(self, server_data: dict):
         """Initiates download functions for the given server."""
         print("Running download")
         server_dir = await self.getserverdir()
-        common.makedir(server_dir)
-        os.chdir(server_dir)
-        file_dir = server_data['download']['file']
+        min_free, policy = await self.disk_policy()
+        await self.host.makedirs(server_dir)
+        self.current_dir = server_dir
+        file_dir = os.path.join(server_dir, server_data['download']['file'])
         link = server_data['download']['link']
-        await common.download_file(link, file_dir)
-        await self.run_command("setup")
-        os.chdir(common.getbotdir())
+        try:
+            warning = await self.host.download(link, file_dir, min_free, policy)
+            if warning is not None:
+                print("Server '{}': {}".format(self.server_name, warning))
+            await self.run_command("setup")
+        except errors.DiskSpaceError:
+            await self.host.remove(server_dir)  # so the next start doesn't treat it as downloaded.
+            raise
+        finally:
+            self.current_dir = None
+            self.disk.mark_dirty(server_dir)
 
     @tasks.loop(seconds=1)
     async def server_cleanup(self):
         """Resets server-specific values after a server has terminated for any reason."""
+        perf.detach()
         if self.current_process is not None:
-            if self.current_process.returncode is not None and hasattr(self.console_read, "finished"):
+            if self.current_process.returncode is not None and \
+                    (hasattr(self.console_read, "finished") or self.current_console is None):
+                idle = self.server_data['meta'].get('idle', {})
+                if self.stop_reason in ["idle", "rotate"] and idle.get('wake') and 'port' in idle:
+                    self.sleep(self.server_name, self.host, idle['port'], self.current_console)
+                if self.console_read.is_running():  # so the next server can start it again right away.
+                    self.console_read.cancel()
+                    while self.console_read.is_running():
+                        await asyncio.sleep(0.1)
+                if hasattr(self.console_read, "finished"):
+                    del self.console_read.finished
+                self.stop_reason = None
+                self.players = 0
                 self.server_data = None
+                self.server_name = None
                 self.current_process = None
                 self.current_console = None
+                self.current_dir = None
+                self.host = None
+                self.throttle_state = None
                 await self.bot.change_presence(activity=None)
-                os.chdir(common.getbotdir())
                 print("The running server has been terminated, resetting values.")
 
+    async def stop_server(self, reason: str):
+        """Run the stop command of the running server, remembering why it was stopped."""
+        print("Stopping server '{}' ({})".format(self.server_name, reason))
+        self.stop_reason = reason
+        await self.unthrottle()  # a paused server can't read its stop command.
+        await self.run_command("stop")
+
+    @tasks.loop(seconds=30)
+    async def idle_monitor(self):
+        """Stops the running server once nobody has been connected for its configured idle timeout.
+
+        Activity is either open TCP connections on meta.idle.port, or players counted from console
+        lines matching meta.idle.join_pattern and leave_pattern."""
+        perf.detach()
+        if self.current_process is None or self.current_process.returncode is not None or self.stop_reason is not None:
+            return
+        idle = self.server_data['meta'].get('idle')
+        if idle is None or self.last_activity is None:
+            return
+        now = time.monotonic()
+        if self.players > 0:
+            self.last_activity = now
+        if 'port' in idle:
+            try:
+                if await self.host.connections(idle['port']) > 0:
+                    self.last_activity = now
+            except (psutil.Error, errors.AgentError, OSError) as e:
+                print("Couldn't count connections for '{}': {}".format(self.server_name, e))
+        if now - self.last_activity >= idle.get('timeout', 600):
+            await self.alert("Nobody has been on for {} seconds, stopping the server.".format(round(now - self.last_activity)))
+            await self.stop_server("idle")
+
+    @idle_monitor.before_loop
+    async def before_idle_monitor(self):
+        await self.bot.wait_until_ready()
+
+    def track_activity(self, line: str):
+        """Update the player count from a console line using the server's idle patterns."""
+        idle = self.server_data['meta'].get('idle', {}) if self.server_data is not None else {}
+        if 'join_pattern' in idle and re.search(idle['join_pattern'], line):
+            self.players += 1
+            self.last_activity = time.monotonic()
+        elif 'leave_pattern' in idle and re.search(idle['leave_pattern'], line):
+            self.players = max(0, self.players - 1)
+            self.last_activity = time.monotonic()
+
+    def sleep(self, server_name: str, host, port: int, console):
+        """Listen on the server's port and start it again when a client connects."""
+        if server_name in self.sleeping:
+            return
+        print("Server '{}' is sleeping, waiting for a connection on port {}".format(server_name, port))
+        self.sleeping[server_name] = {"host": host, "port": port, "console": console}
+        asyncio.ensure_future(self.wake(server_name))
+
+    async def wake(self, server_name: str):
+        perf.detach()
+        entry = self.sleeping[server_name]
+        try:
+            peer = await entry['host'].wait_for_connection(entry['port'])
+        except (errors.AgentError, OSError) as e:
+            print("Couldn't listen for '{}' on port {}: {}".format(server_name, entry['port'], e))
+            self.sleeping.pop(server_name, None)
+            return
+        if peer is None or self.sleeping.pop(server_name, None) is None:  # cancelled.
+            return
+        print("Connection from {} is waking server '{}'".format(peer, server_name))
+        destination = None
+        if entry['console'] is not None:
+            destination = discord.utils.get(self.bot.get_all_channels(), id=entry['console'])
+        if destination is None:
+            destination = self.bot.appinfo.owner
+        if self.current_process is not None:  # rotate out the running server.
+            if self.stop_reason is None:
+                await self.stop_server("rotate")
+            for i in range(300):
+                if self.current_process is None:
+                    break
+                await asyncio.sleep(1)
+            else:
+                message = "Server '{}' didn't stop, not waking '{}'.".format(self.server_name, server_name)
+                print(message)
+                await self.bot.outbound.send(destination, message, priority=outbound.ALERT, wait=False)
+                self.sleep(server_name, entry['host'], entry['port'], entry['console'])  # wait for the next one.
+                return
+        await self.start_server(destination, server_name)
+
+    async def cancel_wake(self, server_name: str):
+        """Stop waiting for connections to the given sleeping server."""
+        entry = self.sleeping.pop(server_name, None)
+        if entry is not None:
+            try:
+                await entry['host'].cancel_wait(entry['port'])
+            except (errors.AgentError, OSError) as e:
+                print("Couldn't stop the wake listener of '{}': {}".format(server_name, e))
+
+    async def cancel_port_wakes(self, host, port: int):
+        """Stop the wake listeners of sleeping servers on the same host and port, they would keep the port
+        from the server being started."""
+        for name, entry in list(self.sleeping.items()):
+            if entry['host'] is host and entry['port'] == port:
+                print("Server '{}' no longer wakes, port {} is taken by '{}'".format(name, port, self.server_name))
+                await self.cancel_wake(name)
+
+    async def alert(self, message: str):
+        """Send an alert to the console channel of the running server, if it has one."""
+        if self.current_console is not None:
+            channel = discord.utils.get(self.bot.get_all_channels(), id=self.current_console)
+            if channel is not None:
+                await self.bot.outbound.send(channel, message, priority=outbound.ALERT, wait=False)
+
+    @tasks.loop(seconds=30)
+    async def thermal_governor(self):
+        """Evaluates every host, then throttles a running low priority server while its host is too hot or
+        loaded, restoring it once cool."""
+        perf.detach()
+        try:
+            data = await common.loadjson("data/data.json")
+        except FileNotFoundError:  # first run, created in on_ready.
+            return
+        settings = dict(thermal.DEFAULTS, **data['settings'].get('thermal', {}))
+        for host in (await self.gethosts()).values():
+            try:
+                stats = await asyncio.wait_for(host.stats(), 10)
+            except (errors.AgentError, OSError, asyncio.TimeoutError) as e:
+                print("Thermal governor couldn't read stats from '{}': {}".format(host.name, e))
+                continue
+            governor = self.getgovernor(host.name)
+            decision = governor.evaluate(stats.get('temp'), stats['load'], settings)
+            reading = "{}°C, load {:.2f}".format(stats.get('temp'), stats['load'])
+            if decision == "throttle":
+                governor.log("Host '{}' is over its limits ({}).".format(host.name, reading))
+            elif decision == "restore":
+                governor.log("Host '{}' has cooled down ({}).".format(host.name, reading))
+        if self.host is None:
+            return
+        governor = self.getgovernor(self.host.name)
+        if governor.throttled and self.throttle_state is None and self.current_process is not None \
+                and self.server_data['meta'].get('priority', 'normal') == 'low':
+            await self.throttle(settings)
+        elif not governor.throttled and self.throttle_state is not None:
+            await self.unthrottle()
+
+    @thermal_governor.before_loop
+    async def before_thermal_governor(self):
+        await self.bot.wait_until_ready()
+
+    async def throttle(self, settings: dict):
+        """Throttle the running server with its 'throttle' command, or the action from the settings."""
+        name = self.server_data['meta']['name']
+        governor = self.getgovernor(self.host.name)
+        try:
+            if 'throttle' in self.server_data['commands']:
+                await self.run_command("throttle")
+                self.throttle_state = {"action": "command"}
+            elif settings['action'] == 'pause':
+                await self.host.pause(self.current_process, True)
+                self.throttle_state = {"action": "pause"}
+            else:
+                try:
+                    previous = await self.host.renice(self.current_process, settings['nice'])
+                    self.throttle_state = {"action": "renice", "nice": previous}
+                except (psutil.Error, errors.AgentError, OSError) as e:
+                    governor.log("Can't renice '{}', pausing instead: {}".format(name, e))
+                    await self.host.pause(self.current_process, True)
+                    self.throttle_state = {"action": "pause"}
+        except (psutil.Error, errors.AgentError, OSError) as e:
+            governor.log("Failed to throttle '{}': {}".format(name, e))
+            return
+        governor.log("Throttled '{}' ({}).".format(name, self.throttle_state['action']))
+        await self.alert("Host is running hot, throttling the server ({}).".format(self.throttle_state['action']))
+
+    async def unthrottle(self):
+        """Undo whatever throttle() did to the running server. The state is kept when that fails, so the
+        governor tries again on its next run."""
+        state = self.throttle_state
+        if state is None or self.current_process is None:
+            return
+        name = self.server_data['meta']['name']
+        governor = self.getgovernor(self.host.name)
+        try:
+            if state['action'] == 'command':
+                if 'unthrottle' in self.server_data['commands']:
+                    await self.run_command("unthrottle")
+            elif state['action'] == 'pause':
+                await self.host.pause(self.current_process, False)
+            else:
+                await self.host.renice(self.current_process, state['nice'])
+        except (psutil.Error, errors.AgentError, OSError) as e:
+            governor.log("Failed to restore '{}': {}".format(name, e))
+            return
+        self.throttle_state = None
+        governor.log("Restored '{}'.".format(name))
+        await self.alert("Host has cooled down, server restored.")
+
     @tasks.loop(seconds=1)
     async def console_read(self, channel_id):
         """Sends data from process output to the specified discord channel."""
+        perf.detach()
         channel = discord.utils.get(self.bot.get_all_channels(), id=channel_id)
         if self.current_process is not None:
             if self.current_process.stdout.at_eof() is not True:
                 print("Waiting for console output...")
                 data = await self.current_process.stdout.readline()
                 reply = data.decode().strip()
-                await channel.send(reply)
-                print("Sent: {}".format(reply))
+                if len(reply) > 0:
+                    self.track_activity(reply)
+                    await self.bot.outbound.send(channel, reply, priority=outbound.CONSOLE, wait=False)
+                    print("Queued: {}".format(reply))
             else:
                 print("Nothing to read.")
                 self.console_read.finished = True  # keeps the server_cleanup from running until all messages are sent.
@@ -156,100 +461,148 @@ class Servers(commands.Cog):
             await self.current_process.stdin.drain()
             print("Finished console_write")
 
-    async def run_command(self, command: str):  # TODO: Move each case into its' own function for handling.
+    async def run_command(self, command: str):
         """Process the given command found in serverdata."""
-        statustypes = {"playing": discord.ActivityType.playing,
-                       "watching": discord.ActivityType.watching,
-                       "streaming": discord.ActivityType.streaming,
-                       "listening": discord.ActivityType.listening}
         cmd = self.server_data["commands"][command]
         i = 0
         m = len(cmd)
         print("Running command: {}".format(command))
-        for step in cmd:
-            i += 1  # step counter.
-            print("Running step {} of {}".format(i, m))
-            if 'file' in step.keys():
-                print("Running file function for step: {}".format(step))
-                if 'create' in step['file'].keys():
-                    await common.makefile(os.path.join(await self.getserverdir(dirname=step['dir']),
-                                                       step['file']['create']['name']),
-                                          step['file']['create']['data'])
-                if 'extract' in step['file'].keys():
-                    await common.asyncio_extract(step['file']['extract']['name'],
-                                                 await self.getserverdir(dirname=step['file']['extract']['folder']))
-            elif 'presence' in step.keys():
-                if step['presence']['type'] is not None:
-                    activity = discord.Activity(name=step['presence']['status'],
-                                                type=statustypes[step['presence']['type']])
-                else:
-                    activity = None
+        with perf.span("command", detail=command):
+            for step in cmd:
+                i += 1  # step counter.
+                print("Running step {} of {}".format(i, m))
+                with perf.span("step.{}".format(step_type(step)), detail="{} {}/{}".format(command, i, m)):
+                    await self.run_step(step)
+
+    async def run_step(self, step: dict):  # TODO: Move each case into its' own function for handling.
+        """Process a single step of a command."""
+        statustypes = {"playing": discord.ActivityType.playing,
+                       "watching": discord.ActivityType.watching,
+                       "streaming": discord.ActivityType.streaming,
+                       "listening": discord.ActivityType.listening}
+        if 'file' in step.keys():
+            print("Running file function for step: {}".format(step))
+            if 'create' in step['file'].keys():
+                await self.host.makefile(os.path.join(await self.getserverdir(dirname=step['dir']),
+                                                      step['file']['create']['name']),
+                                         step['file']['create']['data'])
+            if 'extract' in step['file'].keys():
+                await self.host.extract(os.path.join(self.current_dir, step['file']['extract']['name']),
+                                        await self.getserverdir(dirname=step['file']['extract']['folder']))
+            self.disk.mark_dirty(await self.getserverdir())
+        elif 'presence' in step.keys():
+            if step['presence']['type'] is not None:
+                activity = discord.Activity(name=step['presence']['status'],
+                                            type=statustypes[step['presence']['type']])
+            else:
+                activity = None
+            with perf.span("discord.change_presence"):
                 await self.bot.change_presence(activity=activity)
-            elif 'shell' in step.keys():
-                self.current_process = await asyncio_subprocess(shlex.split(step['shell']))
-            elif 'channel' in step.keys():
-                print("Found 'channel' key")
-                if step['channel']['type'] == 'console':
-                    print("Found 'console' key")
-                    self.current_console = step['channel']['id']
-                    self.console_read.start(step['channel']['id'])
-            elif 'console' in step.keys():
-                print("Sending command '{}' to server console.".format(step['console']))
-                await self.console_write(step['console'])
-            elif 'command' in step.keys():
-                print("Running command {}.".format(step['command']))
-                await self.run_command(step['command'])
-            elif 'directory' in step.keys():
-                print("Changing directory to: {}".format(step['directory']))
-                os.chdir(await self.getserverdir(step['directory']))
-            elif 'process' in step.keys():
-                if step['process'] == 'kill':
-                    print("Killing current process.")
-                    self.current_process.kill()
-                    await self.current_process.communicate()
+        elif 'shell' in step.keys():
+            self.current_process = await self.host.spawn(shlex.split(step['shell']), self.current_dir,
+                                                         self.server_data['meta'].get('resources', {}),
+                                                         self.server_data['meta']['directories']['main'])
+        elif 'channel' in step.keys():
+            print("Found 'channel' key")
+            if step['channel']['type'] == 'console':
+                print("Found 'console' key")
+                self.current_console = step['channel']['id']
+                self.console_read.start(step['channel']['id'])
+        elif 'console' in step.keys():
+            print("Sending command '{}' to server console.".format(step['console']))
+            await self.console_write(step['console'])
+        elif 'command' in step.keys():
+            print("Running command {}.".format(step['command']))
+            await self.run_command(step['command'])
+        elif 'directory' in step.keys():
+            print("Changing directory to: {}".format(step['directory']))
+            self.current_dir = await self.getserverdir(step['directory'])
+        elif 'process' in step.keys():
+            if step['process'] == 'kill':
+                print("Killing current process.")
+                self.current_process.kill()
+                await self.current_process.communicate()
 
     @commands.group(aliases=["servers"])
     async def server(self, ctx):
         """Manages server control functions."""
         if ctx.invoked_subcommand is None:
-            await ctx.send("Invalid command.")
+            await self.bot.outbound.send(ctx, "Invalid command.")
 
     @server.command(pass_context=True)
     @commands.check(is_admin)
     async def start(self, ctx, server_name: str):
         """Start a server."""
+        await self.cancel_wake(server_name)
+        with perf.span("server.start", detail=server_name):
+            await self.start_server(ctx, server_name)
+
+    async def start_server(self, ctx, server_name: str):
+        """Load the server's JSON data and run its start command, downloading it first if needed."""
         if os.path.exists(getserverjson(server_name)):
-            self.server_data = await load_file_args(await common.loadjson(getserverjson(server_name)))
+            data = await common.loadjson(getserverjson(server_name))
+            with perf.span("servers.load_file_args"):
+                self.server_data = await load_file_args(data)
+            self.server_name = server_name
             print("Loaded '{}' server data.".format(server_name))
-            if common.dircheck(await self.getserverdir()):
-                os.chdir(await self.getserverdir())  # so shell commands run in their directories
-                print("Changed directory to: {}".format(os.getcwd()))
+            try:
+                self.host = await self.gethost(server_name, self.server_data['meta'])
+                downloaded = await self.host.exists(await self.getserverdir())
+            except (errors.AgentError, OSError) as e:
+                embed = await load_embed(self.server_data['meta'])
+                embed.description = str(e)
+                self.server_data = None
+                self.server_name = None
+                self.host = None
+                await self.bot.outbound.send(ctx, embed=embed)
+                return
+            if downloaded:
+                if 'port' in self.server_data['meta'].get('idle', {}):
+                    await self.cancel_port_wakes(self.host, self.server_data['meta']['idle']['port'])
+                self.current_dir = await self.getserverdir()  # so shell commands run in their directories
+                print("Running in directory: {} on host '{}'".format(self.current_dir, self.host.name))
+                self.last_activity = time.monotonic()
+                self.players = 0
                 await self.run_command("start")
                 embed = await load_embed(self.server_data['meta'])
                 embed.description = "Starting server."
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
             else:  # not downloaded yet
                 embed = await load_embed(self.server_data['meta'])
-                embed.description = "Server directory not found, starting download."
-                await ctx.send(embed=embed)
-                embed = await load_embed(self.server_data['meta'])
-                embed.description = "Download finished, run again to start the server."
-                await self.download(self.server_data)
-                await ctx.send(embed=embed)
+                try:
+                    warning = await self.check_disk()
+                    embed.description = "Server directory not found, starting download."
+                    if warning is not None:
+                        embed.add_field(name="Warning", value=warning)
+                    await self.bot.outbound.send(ctx, embed=embed)
+                    embed = await load_embed(self.server_data['meta'])
+                    embed.description = "Download finished, run again to start the server."
+                    await self.download(self.server_data)
+                except errors.DiskSpaceError as e:
+                    embed = await load_embed(self.server_data['meta'])
+                    embed.description = "Download refused. {}".format(e.args[0])
+                    self.server_data = None
+                    self.host = None
+                except errors.AgentError as e:
+                    embed = await load_embed(self.server_data['meta'])
+                    embed.description = "Download failed. {}".format(e.args[0])
+                    self.server_data = None
+                    self.host = None
+                await self.bot.outbound.send(ctx, embed=embed)
         else:
-            await ctx.send("No server by '{}' found".format(server_name))
+            await self.bot.outbound.send(ctx, "No server by '{}' found".format(server_name))
 
     @commands.group()
     async def json(self, ctx):
         """Manages server json files."""
         if ctx.invoked_subcommand is None:
-            await ctx.send("Invalid command.")
+            await self.bot.outbound.send(ctx, "Invalid command.")
 
     @json.command(pass_context=True)
     @commands.check(is_admin)
     async def get(self, ctx, jsonfile):
         """Get a server's JSON data sent to you in DM's."""
-        await ctx.author.send(file=discord.File(getserverjson(jsonfile)))
+        await self.bot.outbound.send(ctx.author, file=discord.File(getserverjson(jsonfile)))
 
     @json.command(pass_context=True)
     @commands.check(is_admin)
@@ -258,14 +611,14 @@ class Servers(commands.Cog):
         if len(ctx.message.attachments) == 0:
             embed = discord.Embed(color=ebed.randomrgb())
             embed.description = "Please attach a file to replace '{}.json'".format(server)
-            await ctx.send(embed=embed)
+            await self.bot.outbound.send(ctx, embed=embed)
         else:
             for file in ctx.message.attachments:
                 savefile = getserverjson(server)
                 await common.download_file(file.url, savefile)
                 embed = discord.Embed(color=ebed.randomrgb())
                 embed.description = "The file '{}.json' was overwritten with new data.".format(server)
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
 
     @json.command(pass_context=True)
     @commands.check(is_admin)
@@ -274,35 +627,59 @@ class Servers(commands.Cog):
         if len(ctx.message.attachments) == 0:
             embed = discord.Embed(color=ebed.randomrgb())
             embed.description = "Please attach a JSON file to add."
-            await ctx.send(embed=embed)
+            await self.bot.outbound.send(ctx, embed=embed)
         else:
             for file in ctx.message.attachments:
                 savefile = getserverjson(server)
                 await common.download_file(file.url, savefile)
                 embed = discord.Embed(color=ebed.randomrgb())
                 embed.description = "The file '{}.json' was added to the server list.".format(server)
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
 
     @server.command(pass_context=True)
     @commands.check(is_admin)
-    async def stop(self, ctx):
-        """Stop the server by running the behaviour in the server's JSON file."""
+    async def stop(self, ctx, server_name: str = None):
+        """Stop the server by running the behaviour in the server's JSON file. Give a sleeping server's name
+        to stop it from waking up."""
+        if server_name is not None and server_name in self.sleeping:
+            await self.cancel_wake(server_name)
+            embed = discord.Embed(color=ebed.randomrgb())
+            embed.description = "Server '{}' will no longer wake on connections.".format(server_name)
+            await self.bot.outbound.send(ctx, embed=embed)
+            return
+        if self.server_data is None or (server_name is not None and server_name != self.server_name):
+            embed = discord.Embed(color=ebed.randomrgb())
+            if server_name is None:
+                embed.description = "No server is running."
+            else:
+                embed.description = "Server '{}' is not running or sleeping.".format(server_name)
+            await self.bot.outbound.send(ctx, embed=embed)
+            return
         embed = await load_embed(self.server_data['meta'])
         embed.description = "Stopping server."
-        await ctx.send(embed=embed)
-        await self.run_command("stop")
+        await self.bot.outbound.send(ctx, embed=embed)
+        await self.stop_server("manual")
 
     @server.command(pass_context=True)
     @commands.check(is_admin)
     async def delete(self, ctx, server):
         directory = await self.getserverdir(server_name=server)
         embed = discord.Embed(color=ebed.randomrgb())
-        if os.path.exists(directory):
-            common.remdir(directory)
-            embed.description = "Deleted server {}".format(server)
+        data = await common.loadjson(getserverjson(server))
+        host = (await self.gethosts()).get(data['meta'].get('host', "local"))
+        if host is None:
+            embed.description = "Host '{}' is not configured.".format(data['meta']['host'])
         else:
-            embed.description = "Server directory does not exist."
-        await ctx.send(embed=embed)
+            try:
+                if await host.exists(directory):
+                    await host.remove(directory)
+                    self.disk.mark_dirty(directory)
+                    embed.description = "Deleted server {}".format(server)
+                else:
+                    embed.description = "Server directory does not exist."
+            except errors.AgentError as e:
+                embed.description = "Couldn't delete server {}. {}".format(server, e.args[0])
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @server.command(pass_context=True)
     @commands.check(is_admin)
@@ -311,19 +688,19 @@ class Servers(commands.Cog):
         if self.server_data is None:
             embed = discord.Embed(color=ebed.randomrgb())
             embed.description = "No server running."
-            await ctx.send(embed=embed)
+            await self.bot.outbound.send(ctx, embed=embed)
         else:
             embed = await load_embed(self.server_data['meta'])
             if command == "start" or command == "setup":
                 embed.description = "System command. Unable to run through this method."
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
             elif command in self.server_data['commands']:
                 embed.description = "Running command: {}".format(command)
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
                 await self.run_command(command)
             else:
                 embed.description = "No command '{command}' found.".format(command=command)
-                await ctx.send(embed=embed)
+                await self.bot.outbound.send(ctx, embed=embed)
 
     @server.command(pass_context=True)
     @commands.check(is_admin)
@@ -336,12 +713,74 @@ class Servers(commands.Cog):
         msg = ""
         for file in os.listdir(os.path.join(common.getbotdir(), "data", "json")):
             count += 1
-            msg += "\n**-** {}".format(os.path.splitext(file)[0])
+            server = os.path.splitext(file)[0]
+            try:
+                size = self.disk.get(await self.getserverdir(server_name=server))
+            except (KeyError, TypeError, ValueError):  # malformed JSON, still list it.
+                size = None
+            if size is None:
+                msg += "\n**-** {}".format(server)
+            else:
+                msg += "\n**-** {} ({})".format(server, disk.format_size(size))
         if count == 0:
             msg += "No servers found."
         embed.add_field(name="{} available".format(count), value=msg, inline=False)
         embed.set_footer(text=ebed.rgb_to_hex(color.to_rgb()))
-        await ctx.send(embed=embed)
+        await self.bot.outbound.send(ctx, embed=embed)
+
+    @server.command(pass_context=True)
+    @commands.check(is_admin)
+    async def status(self, ctx):
+        """Show the running server and disk usage of every server."""
+        if self.server_data is not None:
+            embed = await load_embed(self.server_data['meta'])
+            embed.description = "Running: {}".format(self.server_data['meta']['name'])
+            embed.add_field(name="Host", value=self.host.name)
+            if self.current_process is not None and self.current_process.returncode is None:
+                try:
+                    limits = await self.host.limits(self.current_process)
+                    value = "\n".join("{}: {}".format(key, value) for key, value in sorted(limits.items()))
+                except (psutil.Error, errors.AgentError, OSError) as e:
+                    value = "Unavailable: {}".format(e)
+                embed.add_field(name="Limits", value=value, inline=False)
+            idle = self.server_data['meta'].get('idle')
+            if idle is not None and self.last_activity is not None:
+                embed.add_field(name="Idle", value="{}s of {}s ({} players)".format(
+                    round(time.monotonic() - self.last_activity), idle.get('timeout', 600), self.players))
+        else:
+            embed = discord.Embed(color=ebed.randomrgb())
+            embed.description = "No server running."
+        if self.disk.ready:
+            msg = ""
+            for name, size in sorted(self.disk.sizes.items(), key=lambda item: item[1], reverse=True):
+                msg += "\n**-** {}: {}".format(name, disk.format_size(size))
+            if len(msg) == 0:
+                msg = "No server directories."
+            embed.add_field(name="Disk Usage ({})".format(disk.format_size(self.disk.total())), value=msg, inline=False)
+        else:
+            embed.add_field(name="Disk Usage", value="Still calculating.", inline=False)
+        if len(self.sleeping) > 0:
+            embed.add_field(name="Sleeping", value="\n".join("**-** {} (port {} on '{}')".format(
+                name, entry['port'], entry['host'].name) for name, entry in self.sleeping.items()), inline=False)
+        embed.add_field(name="Free Space", value=disk.format_size(disk.free_space(common.getbotdir() or ".")))
+        embed.add_field(name="Download Cache", value=disk.format_size((await self.gethosts())['local'].cache.total()))
+        await self.bot.outbound.send(ctx, embed=embed)
+
+    @server.command(pass_context=True, name="hosts")
+    @commands.check(is_admin)
+    async def host_list(self, ctx):
+        """List the hosts servers can run on, with their current load."""
+        embed = discord.Embed(title="Hosts", color=ebed.randomrgb())
+        for name, host in (await self.gethosts()).items():
+            try:
+                stats = await asyncio.wait_for(host.stats(), 10)
+                value = "CPU: {}%\nRAM: {}%\nLoad: {:.2f}\nFree: {}".format(round(stats['cpu']), round(stats['ram']),
+                                                                            stats['load'],
+                                                                            disk.format_size(stats['disk_free']))
+            except (errors.AgentError, OSError, asyncio.TimeoutError) as e:
+                value = "Unreachable: {}".format(e)
+            embed.add_field(name=name, value=value)
+        await self.bot.outbound.send(ctx, embed=embed)
 
     @commands.Cog.listener()
     async def on_message(self, msg):
@@ -0,0 +1,175 @@
+"""Server side of the remote host agent, see core.protocol for the wire format."""
+import core.protocol as protocol
+import core.errors as errors
+import core.hosts as hosts
+import asyncio
+import secrets
+import base64
+import hmac
+import os
+
+
+class Agent:
+    """Runs server operations for the bot on the host it is started on.
+
+    :param root: directory every requested path is resolved against, requests can't leave it.
+    :param token: shared secret the bot has to prove it knows.
+    :param config: resource config for spawned servers, see core.resources.Policy.
+    :param cache_bytes: size limit of the download cache."""
+    def __init__(self, root: str, token: str, config: dict = None, cache_bytes: int = 2 * 1024 ** 3):
+        self.root = os.path.realpath(root)
+        self.token = token
+        self.host = hosts.LocalHost(self.root, config=config, cache_bytes=cache_bytes)
+        self.processes = {}
+        self.waiting = {}  # port -> connection whose wake listener holds it.
+        self.writer = None  # latest authenticated connection, receives the console frames.
+        self.next_handle = 0
+
+    def resolve(self, path: str) -> str:
+        """Resolve a bot relative path inside the agent root."""
+        full = os.path.realpath(os.path.join(self.root, path))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            raise errors.AgentError("Path '{}' is outside of the agent root.".format(path))
+        return full
+
+    async def serve(self, address: str, port: int):
+        server = await asyncio.start_server(self.handle_connection, address, port)
+        print("Agent listening on {}:{}, root: {}".format(address, port, self.root))
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        nonce = secrets.token_hex(16)
+        try:
+            await protocol.write_frame(writer, {"op": "hello", "nonce": nonce})
+            auth = await asyncio.wait_for(protocol.read_frame(reader), 10)
+            if auth.get("op") != "auth" or not hmac.compare_digest(str(auth.get("digest")), protocol.sign(self.token, nonce)):
+                print("Rejected connection from {}".format(peer))
+                return
+            await protocol.write_frame(writer, {"op": "ready"})
+            print("Accepted connection from {}".format(peer))
+            self.writer = writer
+            while True:
+                request = await protocol.read_frame(reader)
+                asyncio.ensure_future(self.handle_request(writer, request))
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            if self.writer is writer:
+                self.writer = None
+            for port in [port for port, owner in self.waiting.items() if owner is writer]:
+                await self.host.cancel_wait(port)  # nobody is left to be woken, free the port.
+            writer.close()
+            print("Connection from {} closed".format(peer))
+
+    async def handle_request(self, writer, request: dict):
+        response = {"id": request.get("id")}
+        try:
+            handler = getattr(self, "op_{}".format(request.get("op")), None)
+            if handler is None:
+                raise errors.AgentError("Unknown operation '{}'.".format(request.get("op")))
+            args = request.get("args", {})
+            if request.get("op") == "wait_for_connection":  # cancelled when this connection closes.
+                args['writer'] = writer
+            response['result'] = await handler(**args)
+            response['ok'] = True
+        except Exception as e:
+            response['ok'] = False
+            response['error'] = str(e)
+            response['type'] = type(e).__name__
+        try:
+            await protocol.write_frame(writer, response)
+        except ConnectionError:
+            pass
+
+    async def push(self, frame: dict):
+        """Send a frame to the bot if it is connected, dropping it otherwise."""
+        if self.writer is not None:
+            try:
+                await protocol.write_frame(self.writer, frame)
+            except ConnectionError:
+                pass
+
+    async def pump(self, handle: int, process):
+        """Forward the process output to the bot, then report its exit."""
+        async def drain_stderr():
+            while await process.stderr.read(4096):
+                pass
+        stderr = asyncio.ensure_future(drain_stderr())
+        while True:
+            data = await process.stdout.read(4096)
+            if not data:
+                break
+            await self.push({"op": "console", "handle": handle, "data": base64.b64encode(data).decode()})
+        await process.wait()
+        await stderr
+        del self.processes[handle]
+        await self.push({"op": "exit", "handle": handle, "returncode": process.returncode})
+
+    async def op_spawn(self, args: list, cwd: str, resources: dict = None, group: str = "server"):
+        process = await self.host.spawn(args, self.resolve(cwd), resources, group)
+        self.next_handle += 1
+        handle = self.next_handle
+        self.processes[handle] = process
+        asyncio.ensure_future(self.pump(handle, process))
+        return {"handle": handle, "pid": process.pid}
+
+    async def op_write(self, handle: int, data: str):
+        process = self.processes[handle]
+        process.stdin.write(base64.b64decode(data))
+        await process.stdin.drain()
+
+    async def op_signal(self, handle: int, signal: int):
+        if handle in self.processes:
+            self.processes[handle].send_signal(signal)
+
+    async def op_limits(self, handle: int):
+        return await self.host.limits(self.processes[handle])
+
+    async def op_renice(self, handle: int, value: int):
+        return await self.host.renice(self.processes[handle], value)
+
+    async def op_pause(self, handle: int, paused: bool):
+        await self.host.pause(self.processes[handle], paused)
+
+    async def op_processes(self):
+        return {str(handle): process.pid for handle, process in self.processes.items()}
+
+    async def op_connections(self, port: int):
+        return await self.host.connections(port)
+
+    async def op_wait_for_connection(self, port: int, writer=None):
+        self.waiting[port] = writer
+        try:
+            return await self.host.wait_for_connection(port)
+        finally:
+            if self.waiting.get(port) is writer:
+                del self.waiting[port]
+
+    async def op_cancel_wait(self, port: int):
+        await self.host.cancel_wait(port)
+
+    async def op_stats(self):
+        return await self.host.stats()
+
+    async def op_exists(self, path: str):
+        return await self.host.exists(self.resolve(path))
+
+    async def op_makedirs(self, path: str):
+        await self.host.makedirs(self.resolve(path))
+
+    async def op_remove(self, path: str):
+        await self.host.remove(self.resolve(path))
+
+    async def op_makefile(self, path: str, data: str):
+        await self.host.makefile(self.resolve(path), data)
+
+    async def op_extract(self, path: str, dest: str):
+        await self.host.extract(self.resolve(path), self.resolve(dest))
+
+    async def op_download(self, url: str, path: str, min_free: int = None, policy: str = "refuse"):
+        return await self.host.download(url, self.resolve(path), min_free, policy)
+
+    async def op_free_space(self, path: str):
+        return await self.host.free_space(self.resolve(path))
@@ -0,0 +1,168 @@
+import core.common as common
+import core.perf as perf
+import aiofiles
+import aiohttp
+import hashlib
+import json
+import asyncio
+import shutil
+import time
+import os
+try:
+    import fcntl
+except ImportError:  # Windows, no reflinks.
+    fcntl = None
+
+FICLONE = 0x40049409  # ioctl to reflink a file on btrfs/xfs.
+
+
+def link(source: str, dest: str) -> str:
+    """Place source at dest without copying when possible. Returns how it was placed.
+
+    A reflink is tried first, it shares the data until either side is written. Otherwise a
+    hardlink is made, which shares the file itself: a server writing to it in place changes
+    the cached object too (the cache notices by its size and mtime and downloads it again).
+    Without either it's copied."""
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(dest, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except OSError:
+            if os.path.lexists(dest):
+                os.remove(dest)
+    try:
+        os.link(source, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    shutil.copyfile(source, dest)
+    return "copy"
+
+
+class ArtifactCache:
+    """Downloads shared by every server, stored once under data/cache by content hash.
+
+    index.json maps each URL to the sha256 of its content along with the ETag and
+    Last-Modified headers, so a later download only has to ask the server whether it
+    changed. Objects are linked into server directories rather than copied. When the
+    cache grows over 'max_bytes' the least recently used objects are removed, servers
+    keep their own links to them.
+
+    :param root: callable returning the cache directory."""
+    def __init__(self, root, max_bytes: int = 2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.index = None
+        self.lock = asyncio.Lock()
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root(), "objects", digest)
+
+    def index_path(self) -> str:
+        return os.path.join(self.root(), "index.json")
+
+    async def load(self):
+        if self.index is None:
+            os.makedirs(os.path.join(self.root(), "objects"), exist_ok=True)
+            if os.path.exists(self.index_path()):
+                self.index = await common.loadjson(self.index_path())
+            else:
+                self.index = {}
+
+    def valid(self, entry) -> bool:
+        """Check the object of an index entry still exists and wasn't changed through a link."""
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(self.object_path(entry['hash']))
+        except OSError:
+            return False
+        return stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime']
+
+    def total(self) -> int:
+        """Size in bytes of every object in the cache, reading the index if nothing was fetched yet."""
+        index = self.index
+        if index is None:
+            if not os.path.exists(self.index_path()):
+                return 0
+            with open(self.index_path()) as file:
+                index = json.load(file)
+        return sum({entry['hash']: entry['size'] for entry in index.values()}.values())
+
+    @perf.timed("cache.fetch")
+    async def fetch(self, url: str, dest: str, size_check=None) -> str:
+        """Place the content of url at dest, downloading it only if the cached copy is missing or stale.
+
+        :param size_check: called with the content length before a download is written, may raise to abort.
+        :returns: how the file was placed, for logging."""
+        async with self.lock:
+            await self.load()
+            entry = self.index.get(url)
+            if not self.valid(entry):
+                entry = None
+            headers = {}
+            if entry is not None and entry.get('etag') is not None:
+                headers['If-None-Match'] = entry['etag']
+            if entry is not None and entry.get('last_modified') is not None:
+                headers['If-Modified-Since'] = entry['last_modified']
+            try:
+                entry = await self.download(url, headers, entry, size_check)
+                status = "downloaded" if entry.get('fresh') else "revalidated"
+            except aiohttp.ClientError as e:
+                if entry is None:
+                    raise
+                print("Couldn't revalidate '{}', using cached copy: {}".format(url, e))
+                status = "cached"
+            entry.pop('fresh', None)
+            entry['used'] = time.time()
+            self.index[url] = entry
+            method = link(self.object_path(entry['hash']), dest)
+            await self.evict()
+            await common.dumpjson(self.index, self.index_path())
+        print("Placed '{}' at '{}' ({}, {})".format(url, dest, status, method))
+        return "{} ({})".format(status, method)
+
+    async def download(self, url: str, headers: dict, entry, size_check) -> dict:
+        temp = os.path.join(self.root(), "download.tmp")
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers=headers) as resp:
+                if resp.status == 304 and entry is not None:
+                    return entry
+                resp.raise_for_status()
+                if size_check is not None:
+                    size_check(resp.content_length)
+                digest = hashlib.sha256()
+                async with aiofiles.open(temp, "wb") as fd:
+                    while True:
+                        chunk = await resp.content.read(64 * 1024)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        await fd.write(chunk)
+                etag = resp.headers.get('ETag')
+                last_modified = resp.headers.get('Last-Modified')
+        path = self.object_path(digest.hexdigest())
+        if any(other['hash'] == digest.hexdigest() and self.valid(other) for other in self.index.values()):
+            os.remove(temp)  # same content from another URL.
+        else:
+            os.replace(temp, path)
+        stat = os.stat(path)
+        return {"hash": digest.hexdigest(), "etag": etag, "last_modified": last_modified,
+                "size": stat.st_size, "mtime": stat.st_mtime_ns, "fresh": True}
+
+    async def evict(self):
+        """Remove least recently used objects until the cache fits in max_bytes."""
+        used = {}
+        for entry in self.index.values():
+            used[entry['hash']] = max(used.get(entry['hash'], 0), entry['used'])
+        while self.total() > self.max_bytes and len(used) > 1:
+            digest = min(used, key=used.get)
+            del used[digest]
+            for url in [url for url, entry in self.index.items() if entry['hash'] == digest]:
+                del self.index[url]
+            if os.path.exists(self.object_path(digest)):
+                os.remove(self.object_path(digest))
+            print("Evicted cached object {}".format(digest))
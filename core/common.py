@@ -1,3 +1,4 @@
+import core.perf as perf
 import asyncio
 import aiofiles
 import aiohttp
@@ -24,6 +25,7 @@ def getbotdir() -> str:
     return botdir
 
 
+@perf.timed("common.download_file")
 async def download_file(url, save_file: str, chunk_size=512):  # move to thread
     """Download the given server and initialize setup. Non-Blocking, requires await."""
     print("Running download_file")
@@ -37,6 +39,7 @@ async def download_file(url, save_file: str, chunk_size=512):  # move to thread
                     await fd.write(chunk)
 
 
+@perf.timed("common.read_file")
 async def read_file(path, mode):
     async with aiofiles.open(path, mode) as fp:
         data = await fp.read()
@@ -48,6 +51,7 @@ def extract(path, dest):
         file.extractall(dest)
 
 
+@perf.timed("common.asyncio_extract")
 async def asyncio_extract(path, dest):
     loop = asyncio.get_running_loop()
     await loop.run_in_executor(None, extract, path, dest)
@@ -58,6 +62,7 @@ def dircheck(directory) -> bool:
     return os.path.exists(directory)
 
 
+@perf.timed("common.makefile")
 async def makefile(filename: str, data: any):
     """Make a file with the given data written. Non-Blocking, requires await."""
     root = getbotdir()
@@ -66,6 +71,7 @@ async def makefile(filename: str, data: any):
         await file.write(data)
 
 
+@perf.timed("common.makedir")
 def makedir(*directories: str) -> None:
     """Creates given directories if needed."""
     print("Running makedir")
@@ -84,10 +90,12 @@ def remfile(filepath: str):  # make asynchronous
     os.remove(filepath)
 
 
+@perf.timed("common.remdir")
 def remdir(dirpath: str):
     shutil.rmtree(dirpath)
 
 
+@perf.timed("common.loadjson")
 async def loadjson(filename: str) -> dict:
     """Load json file, return the data. Non-Blocking, requires await."""
     root = getbotdir()
@@ -98,6 +106,7 @@ async def loadjson(filename: str) -> dict:
     return data
 
 
+@perf.timed("common.dumpjson")
 async def dumpjson(data: dict, filename: str):
     """Save data dictionary to the given file. Non-Blocking, requires await."""
     async with aiofiles.open(filename, "w+") as file:
@@ -0,0 +1,136 @@
+import threading
+import shutil
+import time
+import os
+
+
+def format_size(size: int) -> str:
+    """Converts a byte count to a human readable string."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} TB".format(size)
+
+
+def free_space(path: str) -> int:
+    """Returns the free bytes on the filesystem holding the given path."""
+    return shutil.disk_usage(path).free
+
+
+def has_space(path: str, needed: int, min_free: int) -> bool:
+    """Checks if writing 'needed' bytes under path would keep at least 'min_free' bytes free."""
+    return free_space(path) - needed >= min_free
+
+
+class DiskAccountant:
+    """Keeps per-server directory sizes up to date from a background thread.
+
+    The first pass walks every server directory. Afterwards a directory is only
+    listed again when its mtime changes (files added, removed or renamed) or when
+    it has been marked dirty, otherwise its cached file total is reused. Files
+    growing in place don't touch their directory's mtime, so a full rescan still
+    runs every 'full_interval' seconds.
+
+    :param root: callable returning the directory that holds the server directories.
+    :param interval: seconds between incremental rescans.
+    :param full_interval: seconds between full rescans."""
+    def __init__(self, root, interval: int = 60, full_interval: int = 3600):
+        self.root = root
+        self.interval = interval
+        self.full_interval = full_interval
+        self.sizes = {}
+        self.ready = False
+        self._tree = {}  # directory path -> (mtime, size of direct files, subdirectory paths)
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="disk-accountant", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def mark_dirty(self, server_dir: str):
+        """Force the given server directory to be fully rescanned on the next pass."""
+        with self._lock:
+            self._dirty.add(os.path.basename(os.path.normpath(server_dir)))
+        self._wake.set()
+
+    def get(self, server_dir: str):
+        """Returns the size in bytes of the given server directory, or None if unknown."""
+        return self.sizes.get(os.path.basename(os.path.normpath(server_dir)))
+
+    def total(self) -> int:
+        return sum(self.sizes.values())
+
+    def _forget(self, path: str):
+        prefix = path + os.sep
+        for key in [key for key in self._tree if key == path or key.startswith(prefix)]:
+            del self._tree[key]
+
+    def _scan_dir(self, path: str, force: bool) -> int:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._forget(path)
+            return 0
+        cached = self._tree.get(path)
+        if force or cached is None or cached[0] != mtime:
+            files = 0
+            subdirs = []
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            else:
+                                files += entry.stat(follow_symlinks=False).st_size
+                        except OSError:
+                            continue
+            except OSError:
+                self._forget(path)
+                return 0
+            if cached is not None:
+                for old in set(cached[2]) - set(subdirs):
+                    self._forget(old)
+            self._tree[path] = (mtime, files, subdirs)
+        else:
+            files, subdirs = cached[1], cached[2]
+        return files + sum(self._scan_dir(subdir, force) for subdir in subdirs)
+
+    def scan(self, full: bool = False):
+        """Runs one accounting pass over every server directory."""
+        root = self.root()
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = set()
+        sizes = {}
+        if os.path.isdir(root):
+            for entry in os.scandir(root):
+                if entry.is_dir(follow_symlinks=False):
+                    sizes[entry.name] = self._scan_dir(entry.path, full or entry.name in dirty)
+        for name in set(self.sizes) - set(sizes):
+            self._forget(os.path.join(root, name))
+        self.sizes = sizes
+        self.ready = True
+
+    def _run(self):
+        last_full = None
+        while not self._stop.is_set():
+            start = time.monotonic()
+            full = last_full is None or start - last_full >= self.full_interval
+            try:
+                self.scan(full)
+                if full:
+                    last_full = start
+                    print("Disk accounting pass finished in {:.2f}s".format(time.monotonic() - start))
+            except Exception as e:  # keep the thread alive, next pass will retry.
+                print("Disk accounting failed: {}".format(e))
+            self._wake.wait(self.interval)
+            self._wake.clear()
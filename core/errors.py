@@ -1,7 +1,3 @@
-import core.common as common
-import core.embed as ebed
-
-
 class BotError(Exception):
     "Base Exception Class"
     pass
@@ -10,3 +6,13 @@ class BotError(Exception):
 class UserNotFoundError(BotError):
     """Raised when the user is not found."""
     pass
+
+
+class DiskSpaceError(BotError):
+    """Raised when an operation would leave less free disk space than allowed."""
+    pass
+
+
+class AgentError(BotError):
+    """Raised when a remote host agent can't be reached or fails a request."""
+    pass
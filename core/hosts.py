@@ -0,0 +1,400 @@
+"""Hosts the bot can run servers on.
+
+Every host exposes the same coroutines, so the Servers cog doesn't care whether a
+server lives on this machine (LocalHost) or on another Pi running agent.py
+(RemoteHost). Paths given to a host are inside the bot directory, a remote host
+maps them into its own agent root."""
+import core.protocol as protocol
+import core.common as common
+import core.resources as res
+import core.cache as cache
+import core.thermal as thermal
+import core.errors as errors
+import core.disk as disk
+import asyncio
+import psutil
+import signal
+import base64
+import os
+
+
+class LocalHost:
+    """Runs everything on the machine the bot (or agent) is running on.
+
+    :param config: resource config, see core.resources.Policy.
+    :param cache_bytes: size limit of the download cache under data/cache."""
+    def __init__(self, root: str = None, name: str = "local", config: dict = None, cache_bytes: int = 2 * 1024 ** 3):
+        self.name = name
+        self._root = root
+        self.config = config or {}
+        self.cache = cache.ArtifactCache(lambda: os.path.join(self.root, "data", "cache"), cache_bytes)
+        self.listeners = {}  # port -> (server, future) of wake listeners.
+
+    @property
+    def root(self) -> str:
+        return self._root or common.getbotdir()
+
+    def path(self, path: str) -> str:
+        return os.path.join(self.root, path)
+
+    async def spawn(self, args: list, cwd: str, resources: dict = None, group: str = "server"):
+        """Start the program with the given resource policy, returning the asyncio process."""
+        policy = res.Policy(resources or {}, self.config, group)
+        policy.prepare()
+        process = await asyncio.create_subprocess_exec(*policy.wrap(args),
+                                                       cwd=self.path(cwd),
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stdin=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        return process
+
+    async def limits(self, process) -> dict:
+        """Get the resource limits the process actually runs with."""
+        return res.effective(process.pid)
+
+    @staticmethod
+    def process_tree(process) -> list:
+        parent = psutil.Process(process.pid)
+        return [parent] + parent.children(recursive=True)
+
+    async def renice(self, process, value: int) -> int:
+        """Set the nice value of the process, its children and all of their threads, returning the previous
+        value.
+
+        Raising it is refused with PermissionError when the previous value couldn't be restored afterwards,
+        that needs root or a high enough RLIMIT_NICE."""
+        tree = self.process_tree(process)
+        previous = tree[0].nice()
+        if value > previous and not thermal.can_lower_nice(previous):
+            raise PermissionError("Not allowed to restore nice {} after renicing.".format(previous))
+        for proc in tree:
+            try:
+                proc.nice(value)
+                if hasattr(os, "setpriority"):
+                    for thread in proc.threads():  # Linux nice values are per thread, a JVM has dozens.
+                        try:
+                            os.setpriority(os.PRIO_PROCESS, thread.id, value)
+                        except ProcessLookupError:
+                            continue
+            except psutil.NoSuchProcess:
+                continue
+        return previous
+
+    async def pause(self, process, paused: bool):
+        """Stop (SIGSTOP) or continue (SIGCONT) the process and its children."""
+        for proc in self.process_tree(process):
+            try:
+                if paused:
+                    proc.suspend()
+                else:
+                    proc.resume()
+            except psutil.NoSuchProcess:
+                continue
+
+    async def connections(self, port: int) -> int:
+        """Count the established TCP connections to the given local port."""
+        return len([conn for conn in psutil.net_connections(kind="tcp")
+                    if conn.status == psutil.CONN_ESTABLISHED and conn.laddr and conn.laddr.port == port])
+
+    async def wait_for_connection(self, port: int):
+        """Listen on the port until a client connects, returning its address, or None if cancelled.
+
+        The client is disconnected straight away, it's only used to wake an idle server."""
+        connected = asyncio.get_running_loop().create_future()
+
+        async def accept(reader, writer):
+            if not connected.done():
+                connected.set_result(list(writer.get_extra_info("peername") or []))
+            writer.close()
+        server = await asyncio.start_server(accept, port=port)
+        self.listeners[port] = (server, connected)
+        try:
+            return await connected
+        finally:
+            server.close()
+            if self.listeners.get(port, (None, None))[1] is connected:
+                del self.listeners[port]
+
+    async def cancel_wait(self, port: int):
+        """Stop listening on the port, wait_for_connection returns None."""
+        if port in self.listeners:
+            server, connected = self.listeners.pop(port)
+            server.close()  # frees the port right away for the server itself.
+            if not connected.done():
+                connected.set_result(None)
+
+    async def stats(self) -> dict:
+        return {"cpu": psutil.cpu_percent(),
+                "ram": psutil.virtual_memory().percent,
+                "load": thermal.read_load(),
+                "temp": thermal.read_soc_temp(),
+                "disk_free": disk.free_space(self.root or ".")}
+
+    async def exists(self, path: str) -> bool:
+        return common.dircheck(self.path(path))
+
+    async def makedirs(self, path: str):
+        common.makedir(self.path(path))
+
+    async def remove(self, path: str):
+        common.remdir(self.path(path))
+
+    async def makefile(self, path: str, data: str):
+        await common.makefile(self.path(path), data)
+
+    async def extract(self, path: str, dest: str):
+        await common.asyncio_extract(self.path(path), self.path(dest))
+
+    async def download(self, url: str, path: str, min_free: int = None, policy: str = "refuse"):
+        """Get url at path through the download cache. With min_free set, downloads that would leave less
+        free space are refused, or with the 'warn' policy done anyway and a warning returned.
+
+        :returns: the warning, or None."""
+        warning = None
+
+        def size_check(length):
+            nonlocal warning
+            if min_free is not None and length is not None and \
+                    not disk.has_space(os.path.dirname(self.path(path)), length, min_free):
+                msg = "Downloading {} would leave less than {} free.".format(disk.format_size(length),
+                                                                            disk.format_size(min_free))
+                if policy == 'refuse':
+                    raise errors.DiskSpaceError(msg)
+                warning = msg
+        await self.cache.fetch(url, self.path(path), size_check=size_check)
+        return warning
+
+    async def free_space(self, path: str) -> int:
+        return disk.free_space(self.path(path))
+
+
+class RemoteWriter:
+    """Stand-in for the stdin StreamWriter of a process running behind an agent."""
+    def __init__(self, host, handle: int):
+        self.host = host
+        self.handle = handle
+        self.buffer = b""
+
+    def write(self, data: bytes):
+        self.buffer += data
+
+    async def drain(self):
+        data, self.buffer = self.buffer, b""
+        if len(data) > 0:
+            await self.host.request("write", handle=self.handle, data=base64.b64encode(data).decode())
+
+
+class RemoteProcess:
+    """Mirrors the parts of asyncio.subprocess.Process the bot uses, for a process on an agent."""
+    def __init__(self, host, handle: int, pid: int):
+        self.host = host
+        self.handle = handle
+        self.pid = pid
+        self.returncode = None
+        self.stdout = asyncio.StreamReader()
+        self.stdin = RemoteWriter(host, handle)
+        self.exited = asyncio.Event()
+
+    def exit(self, returncode: int):
+        self.returncode = returncode
+        self.stdout.feed_eof()
+        self.exited.set()
+
+    def send_signal(self, sig: int):
+        asyncio.ensure_future(self.host.request("signal", handle=self.handle, signal=int(sig)))
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    async def wait(self) -> int:
+        await self.exited.wait()
+        return self.returncode
+
+    async def communicate(self):
+        await self.wait()
+        return None, None
+
+
+class RemoteHost:
+    """Forwards host operations to an agent over an authenticated socket, connecting on first use."""
+    def __init__(self, name: str, address: str, port: int, token: str):
+        self.name = name
+        self.address = address
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.processes = {}
+        self.next_id = 0
+        self.lock = asyncio.Lock()
+
+    async def connect(self):
+        async with self.lock:
+            if self.writer is not None:
+                return
+            try:
+                reader, writer = await asyncio.wait_for(self.handshake(), 10)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                raise errors.AgentError("Couldn't connect to agent '{}' at {}:{}: {}".format(
+                    self.name, self.address, self.port, str(e) or type(e).__name__))
+            self.reader, self.writer = reader, writer
+            asyncio.ensure_future(self.listen(reader))
+            print("Connected to agent '{}' at {}:{}".format(self.name, self.address, self.port))
+        await self.resync()
+
+    async def handshake(self):
+        """Open the connection and authenticate with the token, returning the streams."""
+        reader, writer = await asyncio.open_connection(self.address, self.port)
+        try:
+            hello = await protocol.read_frame(reader)
+            await protocol.write_frame(writer, {"op": "auth", "digest": protocol.sign(self.token, hello['nonce'])})
+            try:
+                ready = await protocol.read_frame(reader)
+            except asyncio.IncompleteReadError:
+                ready = {}
+        except BaseException:  # including the cancellation when connect() times out.
+            writer.close()
+            raise
+        if ready.get("op") != "ready":
+            writer.close()
+            raise errors.AgentError("Agent '{}' rejected the token.".format(self.name))
+        return reader, writer
+
+    async def resync(self):
+        """Mark processes that ended while disconnected as exited, the agent only sends exit frames to a
+        connected bot. The return code of those is unknown, -1 is used."""
+        if len(self.processes) == 0:
+            return
+        running = await self.request("processes")
+        for handle, process in list(self.processes.items()):
+            if running.get(str(handle)) != process.pid:  # a restarted agent numbers handles from 1 again.
+                print("Process {} on agent '{}' exited while disconnected".format(process.pid, self.name))
+                self.processes.pop(handle).exit(-1)
+
+    async def listen(self, reader):
+        try:
+            while True:
+                frame = await protocol.read_frame(reader)
+                if frame.get("op") == "console":
+                    if frame['handle'] in self.processes:
+                        self.processes[frame['handle']].stdout.feed_data(base64.b64decode(frame['data']))
+                elif frame.get("op") == "exit":
+                    if frame['handle'] in self.processes:
+                        self.processes.pop(frame['handle']).exit(frame['returncode'])
+                elif frame.get("id") in self.pending:
+                    future = self.pending.pop(frame['id'])
+                    if not future.done():  # the caller may have given up on it.
+                        future.set_result(frame)
+        except (asyncio.IncompleteReadError, ConnectionError, errors.AgentError) as e:
+            print("Lost connection to agent '{}': {}".format(self.name, e))
+        finally:
+            self.reader, self.writer = None, None
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(errors.AgentError("Lost connection to agent '{}'.".format(self.name)))
+            self.pending = {}
+
+    async def request(self, op: str, **args):
+        """Send a request to the agent and wait for its result."""
+        await self.connect()
+        writer = self.writer
+        if writer is None:  # lost again while resyncing.
+            raise errors.AgentError("Lost connection to agent '{}'.".format(self.name))
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await protocol.write_frame(writer, {"id": request_id, "op": op, "args": args})
+        except OSError as e:
+            self.pending.pop(request_id, None)
+            raise errors.AgentError("Lost connection to agent '{}': {}".format(self.name, e))
+        response = await future
+        if response['ok']:
+            return response.get("result")
+        if response.get("type") == "DiskSpaceError":
+            raise errors.DiskSpaceError(response['error'])
+        raise errors.AgentError("Agent '{}': {}".format(self.name, response['error']))
+
+    def relative(self, path: str) -> str:
+        """Agents resolve paths against their own root, so strip the bot directory."""
+        if os.path.isabs(path):
+            return os.path.relpath(path, common.getbotdir())
+        return path
+
+    async def spawn(self, args: list, cwd: str, resources: dict = None, group: str = "server") -> RemoteProcess:
+        result = await self.request("spawn", args=args, cwd=self.relative(cwd), resources=resources, group=group)
+        process = RemoteProcess(self, result['handle'], result['pid'])
+        self.processes[result['handle']] = process
+        return process
+
+    async def limits(self, process: RemoteProcess) -> dict:
+        return await self.request("limits", handle=process.handle)
+
+    async def renice(self, process: RemoteProcess, value: int) -> int:
+        return await self.request("renice", handle=process.handle, value=value)
+
+    async def pause(self, process: RemoteProcess, paused: bool):
+        await self.request("pause", handle=process.handle, paused=paused)
+
+    async def connections(self, port: int) -> int:
+        return await self.request("connections", port=port)
+
+    async def wait_for_connection(self, port: int):
+        return await self.request("wait_for_connection", port=port)
+
+    async def cancel_wait(self, port: int):
+        await self.request("cancel_wait", port=port)
+
+    async def stats(self) -> dict:
+        return await self.request("stats")
+
+    async def exists(self, path: str) -> bool:
+        return await self.request("exists", path=self.relative(path))
+
+    async def makedirs(self, path: str):
+        await self.request("makedirs", path=self.relative(path))
+
+    async def remove(self, path: str):
+        await self.request("remove", path=self.relative(path))
+
+    async def makefile(self, path: str, data: str):
+        await self.request("makefile", path=self.relative(path), data=data)
+
+    async def extract(self, path: str, dest: str):
+        await self.request("extract", path=self.relative(path), dest=self.relative(dest))
+
+    async def download(self, url: str, path: str, min_free: int = None, policy: str = "refuse"):
+        return await self.request("download", url=url, path=self.relative(path), min_free=min_free, policy=policy)
+
+    async def free_space(self, path: str) -> int:
+        return await self.request("free_space", path=self.relative(path))
+
+
+def load(settings: dict) -> dict:
+    """Build the host list from the bot settings, always including the local host."""
+    result = {"local": LocalHost(config=settings.get("resources", {}),
+                                 cache_bytes=settings.get("cache", {}).get("max_mb", 2048) * 1024 * 1024)}
+    for name, host in settings.get("hosts", {}).items():
+        result[name] = RemoteHost(name, host['address'], host.get('port', 8765), host['token'])
+    return result
+
+
+async def least_loaded(host_list: dict):
+    """Pick the reachable host with the lowest load, preferring the local host on ties."""
+    best = None
+    best_score = None
+    for host in host_list.values():
+        try:
+            stats = await asyncio.wait_for(host.stats(), 10)
+        except (errors.AgentError, OSError, asyncio.TimeoutError) as e:
+            print("Skipping host '{}' for placement: {}".format(host.name, e))
+            continue
+        score = stats['cpu'] + stats['ram'] + stats['load'] * 100
+        if best is None or score < best_score:
+            best, best_score = host, score
+    return best
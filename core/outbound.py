@@ -0,0 +1,122 @@
+from discord.ext import commands
+import core.perf as perf
+import collections
+import asyncio
+import time
+
+# Priority classes, lower goes first.
+REPLY = 0
+ALERT = 1
+CONSOLE = 2
+NAMES = {REPLY: "reply", ALERT: "alert", CONSOLE: "console"}
+
+
+class Message:
+    def __init__(self, destination, content, kwargs: dict, future):
+        self.destination = destination
+        self.content = content
+        self.kwargs = kwargs
+        self.future = future
+        self.queued = time.perf_counter()
+
+
+class Channel:
+    """Pending messages for a single channel, one queue per priority class."""
+    def __init__(self):
+        self.levels = {priority: collections.deque() for priority in NAMES}
+        self.ready = asyncio.Event()
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels.values())
+
+    def pop(self):
+        for priority in sorted(self.levels):
+            if len(self.levels[priority]) > 0:
+                return priority, self.levels[priority].popleft()
+        return None, None
+
+
+class Dispatcher:
+    """Sends every outbound message of the bot through per-channel queues.
+
+    Command replies go out before alerts, alerts before console output, so a busy
+    console relay can't hold up admin commands. Consecutive plain-text console
+    messages for the same channel are joined into one message up to 'coalesce_limit'."""
+    def __init__(self, coalesce_limit: int = 1900):
+        self.coalesce_limit = coalesce_limit
+        self.channels = {}
+        self.workers = {}
+
+    @staticmethod
+    def key(destination) -> int:
+        if isinstance(destination, commands.Context):
+            return destination.channel.id
+        return destination.id  # channels and users (DMs) share the snowflake id space.
+
+    async def send(self, destination, content=None, priority: int = REPLY, wait: bool = True, **kwargs):
+        """Queue a message for the destination (a Context, channel or user).
+
+        :param wait: wait for the message to be sent and return it, raising any send error."""
+        key = self.key(destination)
+        if key not in self.channels:
+            self.channels[key] = Channel()
+            self.workers[key] = asyncio.ensure_future(self.worker(self.channels[key]))
+        channel = self.channels[key]
+        future = asyncio.get_running_loop().create_future()
+        channel.levels[priority].append(Message(destination, content, kwargs, future))
+        channel.ready.set()
+        if wait:
+            return await future
+        future.add_done_callback(lambda done: done.exception())  # already logged by the worker.
+        return None
+
+    def coalesce(self, channel: Channel, message: Message) -> Message:
+        """Join the console messages waiting behind the given one into it."""
+        level = channel.levels[CONSOLE]
+        merged = [message]
+        length = len(message.content)
+        while len(level) > 0 and len(level[0].kwargs) == 0 and level[0].content is not None and \
+                length + len(level[0].content) + 1 <= self.coalesce_limit:
+            merged.append(level.popleft())
+            length += len(merged[-1].content) + 1
+        if len(merged) == 1:
+            return message
+        combined = Message(message.destination, "\n".join(item.content for item in merged), {},
+                           asyncio.get_running_loop().create_future())
+        combined.queued = message.queued
+
+        def finish(future):
+            for item in merged:
+                if item.future.done():  # the caller stopped waiting.
+                    continue
+                if future.exception() is not None:
+                    item.future.set_exception(future.exception())
+                else:
+                    item.future.set_result(future.result())
+        combined.future.add_done_callback(finish)
+        return combined
+
+    async def worker(self, channel: Channel):
+        perf.detach()  # created inside whichever command sent first, its sends aren't part of that trace.
+        while True:
+            await channel.ready.wait()
+            priority, message = channel.pop()
+            if message is None:
+                channel.ready.clear()
+                continue
+            if priority == CONSOLE and len(message.kwargs) == 0 and message.content is not None:
+                message = self.coalesce(channel, message)
+            try:
+                with perf.span("discord.send", detail=NAMES[priority]):
+                    result = await message.destination.send(message.content, **message.kwargs)
+                if not message.future.done():
+                    message.future.set_result(result)
+            except Exception as e:
+                print("Failed to send {} message: {}".format(NAMES[priority], e))
+                if not message.future.done():
+                    message.future.set_exception(e)
+            perf.store.record("outbound.{}".format(NAMES[priority]), time.perf_counter() - message.queued)
+
+    def depth(self) -> dict:
+        """Number of queued messages per channel id."""
+        return {key: len(channel) for key, channel in self.channels.items() if len(channel) > 0}
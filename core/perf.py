@@ -0,0 +1,125 @@
+import logging.handlers
+import contextvars
+import collections
+import functools
+import asyncio
+import logging
+import json
+import time
+
+_current = contextvars.ContextVar("perf_span", default=None)
+_trace_log = logging.getLogger("picontroller.perf")
+_trace_log.propagate = False
+
+
+class Span:
+    """Times a block of code. Spans opened inside another span are recorded as its children."""
+    def __init__(self, name: str, detail: str = None):
+        self.name = name
+        self.detail = detail
+        self.children = []
+        self.parent = None
+        self.start = None
+        self.duration = None
+        self._token = None
+
+    def __enter__(self):
+        self.parent = _current.get()
+        if self.parent is not None:
+            self.parent.children.append(self)
+        self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        _current.reset(self._token)
+        store.record(self.name, self.duration)
+        if self.parent is None and len(self.children) > 0:  # lone spans are only kept as samples.
+            store.add_trace(self)
+        return False
+
+    def to_dict(self) -> dict:
+        data = {"name": self.name, "ms": round(self.duration * 1000, 3)}
+        if self.detail is not None:
+            data['detail'] = self.detail
+        if len(self.children) > 0:
+            data['children'] = [child.to_dict() for child in self.children]
+        return data
+
+
+class Store:
+    """In-memory duration samples per span name, plus the most recent finished traces."""
+    def __init__(self, samples: int = 1024, traces: int = 100):
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=samples))
+        self.traces = collections.deque(maxlen=traces)
+
+    def record(self, name: str, duration: float):
+        self.samples[name].append(duration)
+
+    def add_trace(self, span: Span):
+        self.traces.append(span)
+        if _trace_log.handlers:
+            _trace_log.info(json.dumps(span.to_dict()))
+
+    def percentiles(self, name: str) -> dict:
+        """Returns the sample count and p50/p95/p99 in seconds for the given span name."""
+        values = sorted(self.samples[name])
+        if len(values) == 0:
+            return {"count": 0}
+        result = {"count": len(values)}
+        for p in [50, 95, 99]:
+            result["p{}".format(p)] = values[min(len(values) - 1, int(len(values) * p / 100))]
+        return result
+
+    def slowest(self, count: int = 5) -> list:
+        return sorted(self.traces, key=lambda span: span.duration, reverse=True)[:count]
+
+    def clear(self):
+        self.samples.clear()
+        self.traces.clear()
+
+
+store = Store()
+
+
+def detach():
+    """Forget the span inherited from whoever created the running task.
+
+    asyncio tasks copy the context they were created in, so a long lived task started
+    inside a span would otherwise add everything it ever times to that old trace.
+    Call it at the top of task loops and background workers."""
+    _current.set(None)
+
+
+def span(name: str, detail: str = None) -> Span:
+    """Get a span to use with the 'with' statement."""
+    return Span(name, detail)
+
+
+def timed(name: str):
+    """Decorator wrapping every call of the function in a span of the given name."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with Span(name):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with Span(name):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_trace_file(path: str, max_bytes: int = 1024 * 1024, backups: int = 3):
+    """Write every finished trace as a JSON line to the given rotating file."""
+    for handler in list(_trace_log.handlers):
+        _trace_log.removeHandler(handler)
+        handler.close()
+    handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    _trace_log.addHandler(handler)
+    _trace_log.setLevel(logging.INFO)
@@ -0,0 +1,33 @@
+"""Framing shared by the bot and remote host agents.
+
+Frames are a 4 byte big-endian length followed by a UTF-8 JSON object. On connect
+the agent sends a 'hello' frame with a random nonce, the client answers with an
+'auth' frame holding the HMAC-SHA256 of the nonce keyed with the shared token.
+After that the client sends requests ({"id", "op", "args"}), the agent answers
+each with a response ({"id", "ok", "result"} or {"id", "ok", "error", "type"})
+and pushes 'console' and 'exit' frames for the processes it has spawned."""
+import core.errors as errors
+import asyncio
+import struct
+import hmac
+import json
+
+MAX_FRAME = 16 * 1024 * 1024
+
+
+async def read_frame(reader: asyncio.StreamReader) -> dict:
+    header = await reader.readexactly(4)
+    length = struct.unpack(">I", header)[0]
+    if length > MAX_FRAME:
+        raise errors.AgentError("Frame of {} bytes is too large.".format(length))
+    return json.loads((await reader.readexactly(length)).decode())
+
+
+async def write_frame(writer: asyncio.StreamWriter, data: dict):
+    content = json.dumps(data).encode()
+    writer.write(struct.pack(">I", len(content)) + content)
+    await writer.drain()
+
+
+def sign(token: str, nonce: str) -> str:
+    return hmac.new(token.encode(), nonce.encode(), "sha256").hexdigest()
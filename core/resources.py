@@ -0,0 +1,190 @@
+"""Resource policy for server processes, declared in the server JSON's meta.resources:
+
+    "resources": {"cpus": [1, 2, 3], "nice": 5, "ionice": "idle", "memory": "1G", "cpu_quota": 2.0}
+
+Limits are applied through a cgroup v2 delegate when it's writable. Otherwise only the
+CPU set, nice and ionice are applied, memory and CPU quotas need cgroups. When the
+delegate is the bot's own cgroup the bot is moved into a 'bot' child first, since
+cgroup v2 doesn't delegate controllers from a cgroup that has processes. The cores in
+'reserved_cores' of the host config are kept free for the bot."""
+import psutil
+import shutil
+import errno
+import os
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+IONICE_CLASSES = {"realtime": "1", "best-effort": "2", "idle": "3"}  # ionice -c values.
+
+
+def parse_size(value) -> int:
+    """Converts sizes like '512M' or '2G' to bytes."""
+    if isinstance(value, int):
+        return value
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    value = value.strip().upper().rstrip("B")
+    if value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def own_cgroup():
+    """Get the cgroup v2 directory the bot was started in, or None without cgroup v2.
+
+    Once the bot has moved itself into the 'bot' child (see Policy.evacuate) that's its parent."""
+    try:
+        with open("/proc/self/cgroup") as file:
+            for line in file:
+                if line.startswith("0::"):
+                    path = os.path.join(CGROUP_ROOT, line.strip()[3:].lstrip("/"))
+                    return os.path.dirname(path) if os.path.basename(path) == "bot" else path
+    except OSError:
+        pass
+    return None
+
+
+def default_reserved() -> list:
+    return [0] if (os.cpu_count() or 1) > 1 else []
+
+
+class Policy:
+    """Resource limits for one server process.
+
+    :param resources: the server's meta.resources.
+    :param config: the host config, 'reserved_cores' and 'cgroup' (the delegated cgroup directory,
+        defaults to the bot's own cgroup).
+    :param name: name of the cgroup created for the server."""
+    def __init__(self, resources: dict, config: dict, name: str):
+        self.name = name
+        reserved = set(config.get('reserved_cores', default_reserved()))
+        available = set(range(os.cpu_count() or 1))
+        cpus = set(resources.get('cpus', available)) & available
+        if len(cpus - reserved) > 0:
+            cpus -= reserved
+        self.cpus = sorted(cpus)
+        self.nice = resources.get('nice')
+        self.ionice = resources.get('ionice')
+        self.memory = parse_size(resources['memory']) if 'memory' in resources else None
+        self.cpu_quota = resources.get('cpu_quota')
+        self.base = config.get('cgroup') or own_cgroup()
+        self.cgroup = None
+
+    def write(self, filename: str, value: str):
+        with open(os.path.join(self.cgroup, filename), "w") as file:
+            file.write(value)
+
+    def enable(self, controller: str):
+        """Hand a controller to the cgroups below base, not every controller is delegated."""
+        path = os.path.join(self.base, "cgroup.subtree_control")
+        try:
+            with open(path, "w") as file:
+                file.write("+{}".format(controller))
+        except OSError as e:
+            if e.errno != errno.EBUSY or os.path.normpath(self.base) == CGROUP_ROOT:
+                return
+            self.evacuate()  # base still has processes of its own, usually the bot.
+            try:
+                with open(path, "w") as file:
+                    file.write("+{}".format(controller))
+            except OSError:
+                pass
+
+    def evacuate(self):
+        """Move the processes in base into a 'bot' leaf. cgroup v2 only enables controllers for the children
+        of a cgroup without processes, so this is needed when base is the bot's own cgroup."""
+        leaf = os.path.join(self.base, "bot")
+        os.makedirs(leaf, exist_ok=True)
+        with open(os.path.join(self.base, "cgroup.procs")) as file:
+            pids = file.read().split()
+        for pid in pids:
+            try:
+                with open(os.path.join(leaf, "cgroup.procs"), "w") as file:
+                    file.write(pid)
+            except ProcessLookupError:  # exited meanwhile.
+                continue
+        print("Moved {} process(es) from '{}' into '{}' to delegate controllers".format(len(pids), self.base, leaf))
+
+    def report(self, controllers: list):
+        """Log the requested limits that can't be applied without their controller."""
+        for key, controller in [("memory", "memory"), ("cpu_quota", "cpu")]:
+            if getattr(self, key) is not None and controller not in controllers:
+                print("{} limit of '{}' not applied, the {} controller isn't available in '{}'".format(
+                    key, self.name, controller, self.base))
+
+    def prepare(self):
+        """Create the server's cgroup and write its limits, falling back to no cgroup if that fails.
+
+        Runs in the bot before spawning."""
+        if self.base is None:
+            self.report([])
+            return
+        try:
+            for controller in ["cpu", "cpuset", "memory"]:
+                self.enable(controller)
+            self.cgroup = os.path.join(self.base, "pi-{}".format(self.name))
+            os.makedirs(self.cgroup, exist_ok=True)
+            with open(os.path.join(self.cgroup, "cgroup.controllers")) as file:
+                controllers = file.read().split()
+            self.report(controllers)
+            if "cpuset" in controllers:
+                self.write("cpuset.cpus", ",".join(str(cpu) for cpu in self.cpus))
+            if "memory" in controllers:
+                self.write("memory.max", str(self.memory) if self.memory is not None else "max")
+            if "cpu" in controllers:
+                if self.cpu_quota is not None:
+                    self.write("cpu.max", "{} 100000".format(int(self.cpu_quota * 100000)))
+                else:
+                    self.write("cpu.max", "max 100000")
+        except OSError as e:
+            print("cgroup '{}' not writable, falling back to affinity/nice: {}".format(self.base, e))
+            self.report([])
+            self.cgroup = None
+
+    def wrap(self, args: list) -> list:
+        """Prefix the command so the limits hold before the server runs anything, and are inherited by
+        every thread and process it starts.
+
+        A small sh moves itself into the cgroup before exec'ing the rest, taskset, nice and ionice set the
+        CPU set and priorities the same way. Tools that aren't installed are skipped with a message."""
+        if os.name != "posix":
+            return args
+        prefix = []
+        if self.cgroup is not None:
+            prefix += ["sh", "-c", 'echo $$ > "$0"; exec "$@"', os.path.join(self.cgroup, "cgroup.procs")]
+        tools = []
+        if len(self.cpus) > 0:
+            tools.append(["taskset", "-c", ",".join(str(cpu) for cpu in self.cpus)])
+        if self.nice is not None:  # nice takes an increment to the bot's own value.
+            tools.append(["nice", "-n", str(self.nice - os.getpriority(os.PRIO_PROCESS, 0))])
+        if self.ionice is not None and self.ionice in IONICE_CLASSES:
+            tools.append(["ionice", "-c", IONICE_CLASSES[self.ionice]])
+        for tool in tools:
+            if shutil.which(tool[0]) is None:
+                print("'{}' not found, not applying it to '{}'".format(tool[0], self.name))
+                continue
+            prefix += tool
+        return prefix + args
+
+
+def effective(pid: int) -> dict:
+    """Read back the limits the process actually runs with."""
+    process = psutil.Process(pid)
+    result = {"nice": process.nice()}
+    if hasattr(process, "cpu_affinity"):
+        result['cpus'] = process.cpu_affinity()
+    if hasattr(process, "ionice"):
+        ioclass = process.ionice().ioclass
+        result['ionice'] = next((name for name, value in IONICE_CLASSES.items() if value == str(int(ioclass))), "none")
+    try:
+        with open("/proc/{}/cgroup".format(pid)) as file:
+            path = next((line.strip()[3:] for line in file if line.startswith("0::")), None)
+    except OSError:
+        path = None
+    if path is not None:
+        result['cgroup'] = path
+        for key, filename in [("memory", "memory.max"), ("cpu_quota", "cpu.max")]:
+            try:
+                with open(os.path.join(CGROUP_ROOT, path.lstrip("/"), filename)) as file:
+                    result[key] = file.read().strip()
+            except OSError:
+                continue
+    return result
@@ -0,0 +1,76 @@
+import collections
+import datetime
+import psutil
+import os
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Sensor names used by the Raspberry Pi and common x86 boards, in order of preference.
+SOC_SENSORS = ['cpu_thermal', 'cpu-thermal', 'soc_thermal', 'coretemp', 'k10temp', 'acpitz']
+DEFAULTS = {"temp_high": 75, "temp_low": 65, "load_high": 1.5, "load_low": 1.0, "action": "pause", "nice": 15}
+
+
+def read_soc_temp():
+    """Get the SoC temperature in °C, or None if no sensor is available."""
+    if not hasattr(psutil, "sensors_temperatures"):
+        return None
+    sensors = psutil.sensors_temperatures()
+    if len(sensors) == 0:
+        return None
+    name = next((name for name in SOC_SENSORS if name in sensors), next(iter(sensors)))
+    if len(sensors[name]) == 0:
+        return None
+    return sensors[name][0].current
+
+
+def read_load() -> float:
+    """Get the 1 minute load average per core."""
+    if not hasattr(os, "getloadavg"):
+        return psutil.cpu_percent() / 100
+    return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+def can_lower_nice(value: int) -> bool:
+    """Check if this process may set a nice value as low as 'value' again, which needs root or a high
+    enough RLIMIT_NICE (CAP_SYS_NICE isn't checked)."""
+    if resource is None or not hasattr(resource, "RLIMIT_NICE"):
+        return os.name != "posix"
+    if os.geteuid() == 0:
+        return True
+    limit = resource.getrlimit(resource.RLIMIT_NICE)[0]
+    return limit == resource.RLIM_INFINITY or 20 - limit <= value
+
+
+def c_to_f(celsius: float) -> float:
+    return celsius * 9 / 5 + 32
+
+
+class Governor:
+    """Decides when the host is too hot or loaded, with separate thresholds to come back
+    down so servers aren't flipped between states on every reading."""
+    def __init__(self):
+        self.throttled = False
+        self.temp = None
+        self.load = None
+        self.decisions = collections.deque(maxlen=10)
+
+    def evaluate(self, temp, load: float, settings: dict):
+        """Returns 'throttle' or 'restore' when the state should change, otherwise None."""
+        settings = dict(DEFAULTS, **settings)
+        self.temp = temp
+        self.load = load
+        if not self.throttled:
+            if (temp is not None and temp >= settings['temp_high']) or load >= settings['load_high']:
+                self.throttled = True
+                return "throttle"
+        elif (temp is None or temp <= settings['temp_low']) and load <= settings['load_low']:
+            self.throttled = False
+            return "restore"
+        return None
+
+    def log(self, message: str):
+        """Record a decision to be shown in the status command."""
+        print("Thermal governor: {}".format(message))
+        self.decisions.append((datetime.datetime.now().strftime("%H:%M:%S"), message))
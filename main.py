@@ -4,12 +4,15 @@ import logging
 import pathlib
 import os
 import core.common as common
+import core.outbound as outbound
+import core.perf as perf
 
 # Logging Controller
 logging.basicConfig(level=logging.INFO)
 
 # Discord Bot Controller
 bot = commands.Bot(command_prefix="pi.")
+bot.outbound = outbound.Dispatcher()
 cogs = ['cogs.core', 'cogs.servers', 'cogs.github']
 if __name__ == '__main__':
     for cog in cogs:
@@ -27,6 +30,7 @@ async def on_ready():
         bot.appinfo = await bot.application_info()
     owner = bot.appinfo.owner.id
     common.makedir("data", "data/json", "data/servers")
+    perf.set_trace_file(str(root.joinpath("data/perf.log")))
     if root.joinpath("data/data.json").exists():
         print("Preloading data.json")  # TODO: Add server moderators, people who can control specific server.
     else:
@@ -42,6 +46,15 @@ async def on_ready():
         data['settings'] = {}
     if 'do_updates' not in data['settings']:
         data['settings']['do_updates'] = True
+    if 'disk' not in data['settings']:
+        data['settings']['disk'] = {"min_free_mb": 1024, "policy": "warn"}  # policy: 'warn' or 'refuse'
+    if 'thermal' not in data['settings']:  # load is per core, action: 'renice' or 'pause'
+        data['settings']['thermal'] = {"temp_high": 75, "temp_low": 65, "load_high": 1.5, "load_low": 1.0,
+                                       "action": "pause", "nice": 15}
+    if 'resources' not in data['settings']:  # cgroup: delegated cgroup v2 directory, null uses the bot's own.
+        data['settings']['resources'] = {"reserved_cores": [0], "cgroup": None}
+    if 'cache' not in data['settings']:
+        data['settings']['cache'] = {"max_mb": 2048}
     await common.dumpjson(data, "data/data.json")
     if data['settings']['do_updates'] is True:
         print("Running update check.")